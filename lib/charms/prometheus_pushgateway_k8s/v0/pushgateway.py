@@ -101,20 +101,62 @@ is ready), passing its name and value:
 
 The requirer is ready when the relation to the Prometheus Pushgateway is properly established.
 
-The `send_metric` call will just end quietly if the metric was sent succesfully, or will raise
-an exception if something is wrong (that error should be logged or informed to the operator).
+Several metrics can be sent at once, in a single request to the Pushgateway:
+
+```
+    if self.pushgateway_requirer.is_ready():
+        self.pushgateway_requirer.send_metrics({"test_metric": 3.141592, "other_metric": 42})
+```
+
+Or, when it's more convenient to send them one by one, grouping them in a batch:
+
+```
+    with self.pushgateway_requirer.batch() as batch:
+        batch.send_metric("test_metric", 3.141592)
+        batch.send_metric("other_metric", 42)
+```
+
+To avoid blocking the charm while the metrics travel to the Pushgateway, they can be sent from a
+background thread, passing `async_send=True` when instantiating the requirer. In that case
+errors are only logged, and the metrics still waiting are sent before the charm finishes
+handling the event (or when calling `flush()`).
+
+Charms running an asyncio event loop can use `asend_metric` and `asend_metrics` instead, which
+take the same arguments and do not block the loop while the metrics are sent.
+
+The `send_metric` and `send_metrics` calls will just end quietly if the metrics were sent
+succesfully, or will raise an exception if something is wrong (that error should be logged or
+informed to the operator).
 """
 
+import functools
+import http.client
+import io
 import json
 import logging
+import re
+import socket
 import ssl
-from typing import Optional, Union
-from urllib import request
-from urllib.error import HTTPError
+import threading
+import time
+from typing import TYPE_CHECKING, Dict, List, Mapping, MutableMapping, Optional, Tuple, Union
+from urllib import parse
+from urllib.error import HTTPError, URLError
 
 from ops.charm import CharmBase, RelationEvent
 from ops.framework import Object
 
+try:
+    # faster parsing of the relation data, if available
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
+# asyncio, gzip and queue are imported only when needed, as ops doesn't load them
+# and the library is imported in every hook of the charms using it
+if TYPE_CHECKING:
+    import queue
+
 logger = logging.getLogger(__name__)
 
 
@@ -126,11 +168,272 @@ LIBAPI = 0
 
 # Increment this PATCH version before using `charmcraft publish-lib` or reset
 # to 0 if you are raising the major API version
-LIBPATCH = 2
+LIBPATCH = 3
 
 # the key in the relation data
 RELATION_KEY = "push-endpoint"
 
+# the Prometheus text exposition format, used to send the metrics
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# the valid metric names, as defined in the Prometheus data model
+_METRIC_NAME_RE = re.compile(r"[a-zA-Z_:][a-zA-Z0-9_:]*")
+
+
+@functools.lru_cache(maxsize=4)
+def _ssl_context(verify: bool) -> ssl.SSLContext:
+    """Build the SSL context for the connections, verifying the certificates or not.
+
+    Loading the system CA certificates is expensive, so only one context is built
+    for each case and it's shared by all the connections.
+    """
+    ctx = ssl.create_default_context()
+    if not verify:
+        ctx.check_hostname = False
+        ctx.verify_mode = ssl.CERT_NONE
+    return ctx
+
+
+def _validate_name(name: str) -> None:
+    """Check that the metric name is valid, raise ValueError if not."""
+    if not isinstance(name, str):
+        raise ValueError("The name must be a valid Prometheus metric name.")
+    _validate_name_str(name)
+
+
+@functools.lru_cache(maxsize=256)
+def _validate_name_str(name: str) -> None:
+    """Check the string is a valid metric name, raise ValueError if not.
+
+    Charms tend to send the same metrics over and over, so the names already
+    validated are remembered.
+    """
+    if not _METRIC_NAME_RE.fullmatch(name):
+        raise ValueError("The name must be a valid Prometheus metric name.")
+
+
+def _validate_metrics(metrics: Mapping[str, Union[float, int]]) -> None:
+    """Check that all the metrics are valid, raise ValueError if not."""
+    for name, value in metrics.items():
+        _validate_name(name)
+        if not isinstance(value, (float, int)):
+            raise ValueError("The metric value must be an integer or float number.")
+
+
+def _format_value(value: Union[float, int]) -> bytes:
+    """Render the metric value as a number in the Prometheus text format.
+
+    The base types representation is used, so subclasses (e.g. bool or numpy
+    floats) are rendered as plain numbers too.
+    """
+    if isinstance(value, float):
+        return float.__repr__(value).encode("ascii")
+    return int.__repr__(value).encode("ascii")
+
+
+def _build_payload(metrics: Mapping[str, Union[float, int]]) -> bytearray:
+    """Build the request body for the metrics, in the Prometheus text format."""
+    payload = bytearray()
+    for name, value in metrics.items():
+        payload += name.encode("ascii")
+        payload += b" "
+        payload += _format_value(value)
+        payload += b"\n"
+    return payload
+
+
+class _PushgatewayClient:
+    """Client for a Pushgateway, independent of the ops framework.
+
+    It reuses the connections to the server between requests (keep-alive), and
+    can be shared between threads, which send their requests concurrently.
+    """
+
+    __slots__ = ("url", "compress_threshold", "_post_urls", "_connections", "_lock")
+
+    # maximum idle connections kept open for each verify_ssl setting
+    POOL_SIZE = 4
+
+    def __init__(self, url: str, compress_threshold: Optional[int] = None):
+        self.url = url
+        # payloads bigger than this (in bytes) are gzipped; None to never compress
+        self.compress_threshold = compress_threshold
+        # the url to push the metrics of each job, by job name
+        self._post_urls: Dict[str, str] = {}
+        # idle connections to the server, by verify_ssl
+        self._connections: Dict[bool, List[http.client.HTTPConnection]] = {}
+        # protects the idle connections, not held during the requests
+        self._lock = threading.Lock()
+
+    def send_metric(
+        self,
+        name: str,
+        value: Union[float, int],
+        job_name: str = "default",
+        verify_ssl: bool = True,
+        timeout: float = 5.0,
+    ) -> None:
+        """Send a metric to the Pushgateway."""
+        _validate_name(name)  # before using it as a key
+        self.send_metrics({name: value}, job_name, verify_ssl, timeout)
+
+    def send_metrics(
+        self,
+        metrics: Mapping[str, Union[float, int]],
+        job_name: str = "default",
+        verify_ssl: bool = True,
+        timeout: float = 5.0,
+    ) -> None:
+        """Send several metrics to the Pushgateway in a single request.
+
+        Raises HTTPError if the Pushgateway rejected the metrics, or socket.timeout
+        if it didn't answer in time.
+        """
+        _validate_metrics(metrics)
+        if metrics:
+            self.post(job_name, _build_payload(metrics), verify_ssl, timeout)
+
+    def post(
+        self,
+        job_name: str,
+        payload: Union[bytes, bytearray],
+        verify_ssl: bool,
+        timeout: float,
+    ) -> None:
+        """POST the already built payload for the job, compressing it if big enough."""
+        post_url = self._post_url(job_name)
+        if self.compress_threshold is not None and len(payload) > self.compress_threshold:
+            import gzip
+
+            try:
+                self._post(post_url, gzip.compress(payload, 1), verify_ssl, timeout, gzipped=True)
+                return
+            except HTTPError as exc:
+                if exc.code not in (400, 415):
+                    raise
+                # maybe the server does not support compressed pushes, try without
+                self._post(post_url, payload, verify_ssl, timeout)
+                logger.info("Pushgateway at %s refused compressed metrics", self.url)
+                self.compress_threshold = None
+                return
+        self._post(post_url, payload, verify_ssl, timeout)
+
+    def close(self) -> None:
+        """Close the idle connections to the server."""
+        with self._lock:
+            for idle in self._connections.values():
+                for conn in idle:
+                    conn.close()
+            self._connections.clear()
+
+    def _checkout(self, verify_ssl: bool) -> Optional[http.client.HTTPConnection]:
+        """Take an idle connection to the server, if any."""
+        with self._lock:
+            idle = self._connections.get(verify_ssl)
+            return idle.pop() if idle else None
+
+    def _checkin(self, verify_ssl: bool, conn: http.client.HTTPConnection) -> None:
+        """Keep the connection to be reused, unless there are enough idle ones."""
+        with self._lock:
+            idle = self._connections.setdefault(verify_ssl, [])
+            if len(idle) < self.POOL_SIZE:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def _post_url(self, job_name: str) -> str:
+        """Build the url to push the metrics of the job (escaping the job name)."""
+        post_url = self._post_urls.get(job_name)
+        if post_url is None:
+            post_url = self.url + "metrics/job/" + parse.quote(job_name, safe="")
+            self._post_urls[job_name] = post_url
+        return post_url
+
+    def _connect(
+        self, url: parse.SplitResult, verify_ssl: bool, timeout: float
+    ) -> http.client.HTTPConnection:
+        """Open a new connection to the server indicated in the url."""
+        if url.scheme != "https":
+            return http.client.HTTPConnection(url.netloc, timeout=timeout)
+        return http.client.HTTPSConnection(
+            url.netloc, timeout=timeout, context=_ssl_context(verify_ssl)
+        )
+
+    @staticmethod
+    def _request(
+        conn: http.client.HTTPConnection,
+        path: str,
+        payload: Union[bytes, bytearray],
+        gzipped: bool,
+        reused: bool,
+    ) -> None:
+        """Send the POST request through the connection."""
+        headers = {"Content-Type": CONTENT_TYPE, "Content-Length": str(len(payload))}
+        if gzipped:
+            headers["Content-Encoding"] = "gzip"
+        try:
+            conn.request("POST", path, body=payload, headers=headers)
+        except OSError as exc:
+            # a dropped kept-alive connection is retried by the caller, and timeouts are
+            # raised as such (the callers may ignore them); any other failure to reach
+            # the server is reported as urllib does
+            if isinstance(exc, socket.timeout) or (reused and isinstance(exc, ConnectionError)):
+                raise
+            raise URLError(exc) from exc
+
+    def _post(
+        self,
+        post_url: str,
+        payload: Union[bytes, bytearray],
+        verify_ssl: bool,
+        timeout: float,
+        gzipped: bool = False,
+    ) -> None:
+        """POST the payload to the given url, reusing the connection to the server if possible.
+
+        Raises socket.timeout if the server can't be reached or doesn't answer in time,
+        URLError if it can't be reached for other reasons, and HTTPError if it does not
+        answer with a success status.
+        """
+        url = parse.urlsplit(post_url)
+        path = url.path
+        if url.query:
+            path += "?" + url.query
+
+        conn = self._checkout(verify_ssl)
+        reused = conn is not None
+        if conn is None:
+            conn = self._connect(url, verify_ssl, timeout)
+        else:
+            conn.timeout = timeout
+            if conn.sock is not None:
+                conn.sock.settimeout(timeout)
+
+        try:
+            self._request(conn, path, payload, gzipped, reused)
+            response = conn.getresponse()
+            body = response.read()
+        except ConnectionError:
+            conn.close()
+            if not reused:
+                raise
+            # the server closed the kept-alive connection meanwhile, retry with a new one
+            self._post(post_url, payload, verify_ssl, timeout, gzipped)
+            return
+        except Exception:
+            conn.close()
+            raise
+
+        if response.will_close:
+            conn.close()
+        else:
+            self._checkin(verify_ssl, conn)
+
+        if not 200 <= response.status < 300:
+            raise HTTPError(
+                post_url, response.status, response.reason, response.headers, io.BytesIO(body)
+            )
+
 
 class PrometheusPushgatewayProvider(Object):
     """Provider side for the Prometheus Pushgateway.
@@ -168,23 +471,83 @@ class PrometheusPushgatewayProvider(Object):
 
     def _on_relation_changed(self, event: RelationEvent):
         """Send the push endpoint info."""
-        relation_data = event.relation.data[self.app]
-        relation_data[RELATION_KEY] = json.dumps({"url": self.endpoint})
+        self._write_payload(event.relation.data[self.app], self._serialize_endpoint(self.endpoint))
 
     def update_endpoint(self, endpoint: str):
         """Update endpoint in relation data."""
         self.endpoint = endpoint
+        payload = self._serialize_endpoint(endpoint)
 
         for rel in self._charm.model.relations.get(self._relation_name, []):
             if not rel:
                 continue
-            rel.data[self._charm.app][RELATION_KEY] = json.dumps({"url": self.endpoint})
+            self._write_payload(rel.data[self._charm.app], payload)
+
+    @staticmethod
+    def _write_payload(relation_data: MutableMapping[str, str], payload: str) -> None:
+        """Write the payload in the relation data, unless it's already there."""
+        if relation_data.get(RELATION_KEY) != payload:
+            relation_data[RELATION_KEY] = payload
+
+    @staticmethod
+    @functools.lru_cache(maxsize=4)
+    def _serialize_endpoint(endpoint: str) -> str:
+        """Serialize the endpoint info as it's sent in the relation data."""
+        return json.dumps({"url": endpoint}, separators=(",", ":"))
+
+
+class BatchedSender:
+    """Collect metrics to send them all together in a single request when the block ends.
+
+    Use it through `PrometheusPushgatewayRequirer.batch()`. Nothing is sent if the
+    block ends with an exception.
+    """
+
+    def __init__(self, requirer: "PrometheusPushgatewayRequirer", **send_kwargs):
+        self._requirer = requirer
+        self._send_kwargs = send_kwargs
+        self._metrics: Dict[str, Union[float, int]] = {}
+
+    def send_metric(self, name: str, value: Union[float, int]):
+        """Add the metric to the batch (a metric sent twice keeps its last value)."""
+        _validate_name(name)  # before using it as a key
+        _validate_metrics({name: value})
+        self._metrics[name] = value
+
+    def __enter__(self) -> "BatchedSender":
+        """Start collecting metrics."""
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Send all the collected metrics, unless the block failed."""
+        if exc_type is None and self._metrics:
+            self._requirer.send_metrics(self._metrics, **self._send_kwargs)
+
+
+# metrics queued to be sent in the background: client, job name, verify_ssl, timeout, metrics
+_QueueItem = Tuple[_PushgatewayClient, str, bool, float, Dict[str, Union[float, int]]]
 
 
 class PrometheusPushgatewayRequirer(Object):
     """Requirer side for the Prometheus Pushgateway."""
 
-    def __init__(self, charm: CharmBase, relation_name: str = "pushgateway"):
+    # payloads bigger than this (in bytes) are sent gzipped; None (the default) to never
+    # compress. If the Pushgateway refuses compressed payloads they're sent uncompressed
+    COMPRESS_THRESHOLD: Optional[int] = None
+    # maximum amount of sends waiting for the background thread (when `async_send` is used)
+    ASYNC_QUEUE_SIZE = 10000
+    # seconds the background thread waits for more metrics to send them all together,
+    # and the maximum sends grouped that way (the batch goes out when any is reached)
+    ASYNC_BATCH_DELAY = 0.1
+    ASYNC_BATCH_SIZE = 128
+    # times the background thread retries to send if the server can't be reached,
+    # and the seconds to wait before the first retry (doubled each time)
+    ASYNC_RETRIES = 2
+    ASYNC_RETRY_BACKOFF = 0.5
+
+    def __init__(
+        self, charm: CharmBase, relation_name: str = "pushgateway", async_send: bool = False
+    ):
         """Construct the interface for the Prometheus Pushgateway.
 
         Args:
@@ -193,12 +556,49 @@ class PrometheusPushgatewayRequirer(Object):
             relation_name: the name of the relation (whatever was used
                 in the `requires` section in `metadata.yaml` for
                 the `pushgateway` interface.
+            async_send: send the metrics from a background thread, without blocking
+                the caller; errors are logged instead of raised.
         """
         super().__init__(charm, relation_name)
         self._relation_name = relation_name
+        # the clients for the pushgateway, by url (shared with the background sending thread)
+        self._clients: Dict[str, _PushgatewayClient] = {}
+        self._async_send = async_send
+        self._queue: Optional["queue.Queue[_QueueItem]"] = None
+        # the pushgateway url from the relation data, resolved only when needed
+        self._url: Optional[str] = None
+        self._url_resolved = False
 
-    @property
-    def _pushgateway_url(self) -> Optional[str]:
+        events = charm.on[relation_name]
+        self.framework.observe(events.relation_created, self._on_relation_changed)
+        self.framework.observe(events.relation_changed, self._on_relation_changed)
+        self.framework.observe(events.relation_departed, self._on_relation_changed)
+        self.framework.observe(events.relation_broken, self._on_relation_broken)
+        self.framework.observe(self.framework.on.commit, self._on_commit)
+
+    def _on_relation_changed(self, _):
+        """Forget the pushgateway url, the relation data may have changed."""
+        self._url_resolved = False
+
+    def _on_relation_broken(self, _):
+        """Forget the pushgateway url and close the connections to it."""
+        self._url_resolved = False
+        for gateway in self._clients.values():
+            gateway.close()
+        self._clients.clear()
+
+    def _resolve(self) -> Optional[str]:
+        """Get the pushgateway url (or None if not available).
+
+        It's taken from the relation data only the first time, and then remembered
+        until the relation changes.
+        """
+        if not self._url_resolved:
+            self._url = self._fetch_url()
+            self._url_resolved = True
+        return self._url
+
+    def _fetch_url(self) -> Optional[str]:
         """Build the pushgateway url using the relation data (if present, else return None)."""
         relation = self.model.get_relation(self._relation_name)
         if relation is None:
@@ -214,7 +614,7 @@ class PrometheusPushgatewayRequirer(Object):
             )
             return None
         try:
-            data = json.loads(raw_data)
+            data = json_loads(raw_data)
         except json.JSONDecodeError:
             logger.warning(
                 "Prometheus Pushgateway Requirer not ready: corrupt data in the relation"
@@ -232,7 +632,7 @@ class PrometheusPushgatewayRequirer(Object):
 
     def is_ready(self):
         """Return if the service is ready to send metrics."""
-        return self._pushgateway_url is not None
+        return self._resolve() is not None
 
     def send_metric(
         self,
@@ -241,38 +641,234 @@ class PrometheusPushgatewayRequirer(Object):
         ignore_error: bool = False,
         verify_ssl: bool = True,
         job_name: str = "default",
+        timeout: float = 5.0,
     ):
         """Send a metric to the Pushgateway.
 
         Args:
             name: the name of the metric.
             value: the value of the metric.
-            ignore_error: raise or not error while performing the request.
+            ignore_error: raise or not error while performing the request (including
+                the request timing out).
             verify_ssl: verify ssl certificate in the request.
             job_name: name of the job for the current metric.
+            timeout: seconds to wait for the Pushgateway to answer.
         """
-        # This currently follows the "simple API" for the case of one metric
+        _validate_name(name)  # before using it as a key
+        self.send_metrics(
+            {name: value},
+            ignore_error=ignore_error,
+            verify_ssl=verify_ssl,
+            job_name=job_name,
+            timeout=timeout,
+        )
+
+    def send_metrics(
+        self,
+        metrics: Mapping[str, Union[float, int]],
+        ignore_error: bool = False,
+        verify_ssl: bool = True,
+        job_name: str = "default",
+        timeout: float = 5.0,
+    ):
+        """Send several metrics to the Pushgateway in a single request.
+
+        All the metrics are grouped under the same job, as the job is part of
+        the URL the request is sent to; use one call per job.
+
+        Args:
+            metrics: the values of the metrics, by name.
+            ignore_error: raise or not error while performing the request (including
+                the request timing out).
+            verify_ssl: verify ssl certificate in the request.
+            job_name: name of the job for the given metrics.
+            timeout: seconds to wait for the Pushgateway to answer.
+        """
+        # This currently follows the "simple API" for the case of metrics
         # without labels, as indicated here:
         #    https://github.com/prometheus/pushgateway#api
         # TODO: support the more complex cases
 
-        pushgateway_url = self._pushgateway_url
+        pushgateway_url = self._resolve()
         if pushgateway_url is None:
             raise ValueError("The service is not ready.")
-        if not isinstance(name, str) or not name.isascii() or not name:
-            raise ValueError("The name must be a non-empty ASCII string.")
-        if not isinstance(value, (float, int)):
-            raise ValueError("The metric value must be an integer or float number.")
+        gateway = self._client_for(pushgateway_url)
+
+        if self._async_send:
+            import queue
+
+            _validate_metrics(metrics)
+            if not metrics:
+                return  # nothing to send, as in the synchronous case
+            try:
+                self._enqueue((gateway, job_name, verify_ssl, timeout, dict(metrics)))
+                return
+            except queue.Full:
+                logger.warning(
+                    "Too many metrics waiting to be sent to the Pushgateway, sending synchronously"
+                )
+
+        try:
+            gateway.send_metrics(metrics, job_name, verify_ssl, timeout)
+        except (HTTPError, socket.timeout):
+            if not ignore_error:
+                raise
 
-        payload = f"{name} {value}\n".encode("ascii")
-        post_url = f"{pushgateway_url}metrics/job/{job_name}"
-        ctx = ssl.create_default_context()
-        if not verify_ssl:
-            ctx.check_hostname = False
-            ctx.verify_mode = ssl.CERT_NONE
+    def batch(
+        self,
+        ignore_error: bool = False,
+        verify_ssl: bool = True,
+        job_name: str = "default",
+        timeout: float = 5.0,
+    ) -> BatchedSender:
+        """Group the metrics sent inside a `with` block in a single request.
+
+        The arguments are the same as in `send_metrics`, and apply to the whole batch.
+        """
+        return BatchedSender(
+            self,
+            ignore_error=ignore_error,
+            verify_ssl=verify_ssl,
+            job_name=job_name,
+            timeout=timeout,
+        )
+
+    async def asend_metric(
+        self,
+        name: str,
+        value: Union[float, int],
+        ignore_error: bool = False,
+        verify_ssl: bool = True,
+        job_name: str = "default",
+        timeout: float = 5.0,
+    ):
+        """Send a metric to the Pushgateway, without blocking the running event loop.
+
+        The arguments are the same as in `send_metric`.
+        """
+        _validate_name(name)  # before using it as a key
+        await self.asend_metrics(
+            {name: value},
+            ignore_error=ignore_error,
+            verify_ssl=verify_ssl,
+            job_name=job_name,
+            timeout=timeout,
+        )
 
+    async def asend_metrics(
+        self,
+        metrics: Mapping[str, Union[float, int]],
+        ignore_error: bool = False,
+        verify_ssl: bool = True,
+        job_name: str = "default",
+        timeout: float = 5.0,
+    ):
+        """Send several metrics to the Pushgateway, without blocking the running event loop.
+
+        The request is done in the loop's default executor, so several calls awaited
+        together are sent concurrently. The arguments are the same as in `send_metrics`.
+        """
+        pushgateway_url = self._resolve()
+        if pushgateway_url is None:
+            raise ValueError("The service is not ready.")
+        gateway = self._client_for(pushgateway_url)
+
+        import asyncio
+
+        loop = asyncio.get_running_loop()
         try:
-            request.urlopen(post_url, data=payload, context=ctx)
-        except HTTPError:
+            await loop.run_in_executor(
+                None, gateway.send_metrics, metrics, job_name, verify_ssl, timeout
+            )
+        except (HTTPError, socket.timeout):
             if not ignore_error:
                 raise
+
+    def _client_for(self, url: str) -> _PushgatewayClient:
+        """Get the client for the pushgateway in the given url."""
+        gateway = self._clients.get(url)
+        if gateway is None:
+            gateway = self._clients[url] = _PushgatewayClient(url, self.COMPRESS_THRESHOLD)
+        return gateway
+
+    def flush(self):
+        """Wait until all the metrics sent in the background reached the Pushgateway.
+
+        This is called automatically when the charm finishes handling the event, so
+        no metrics are lost when the process ends.
+        """
+        if self._queue is not None:
+            self._queue.join()
+
+    def _on_commit(self, _):
+        """Send whatever is still queued before the charm process ends."""
+        self.flush()
+
+    def _enqueue(self, item: _QueueItem) -> None:
+        """Queue the metrics to be sent by the background thread (started if needed)."""
+        if self._queue is None:
+            import queue
+
+            self._queue = queue.Queue(maxsize=self.ASYNC_QUEUE_SIZE)
+            thread = threading.Thread(target=self._drain, name="pushgateway-sender", daemon=True)
+            thread.start()
+        self._queue.put_nowait(item)
+
+    def _drain(self) -> None:
+        """Send the queued metrics, grouping in one request those queued close in time."""
+        import queue
+
+        assert self._queue is not None
+        while True:
+            item = self._queue.get()
+            deadline = time.monotonic() + self.ASYNC_BATCH_DELAY
+            batches: Dict[
+                Tuple[_PushgatewayClient, str, bool, float], Dict[str, Union[float, int]]
+            ] = {}
+            received = 0
+            while True:
+                gateway, job_name, verify_ssl, timeout, metrics = item
+                # the latest value wins, the Pushgateway rejects repeated samples
+                batches.setdefault((gateway, job_name, verify_ssl, timeout), {}).update(metrics)
+                received += 1
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or received >= self.ASYNC_BATCH_SIZE:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+
+            try:
+                for (gateway, job_name, verify_ssl, timeout), metrics in batches.items():
+                    try:
+                        self._send_batch(gateway, job_name, verify_ssl, timeout, metrics)
+                    except Exception:
+                        # don't let an unexpected error kill the thread, flush() would hang
+                        logger.exception("Error sending the metrics to %s", gateway.url)
+            finally:
+                for _ in range(received):
+                    self._queue.task_done()
+
+    def _send_batch(
+        self,
+        gateway: _PushgatewayClient,
+        job_name: str,
+        verify_ssl: bool,
+        timeout: float,
+        metrics: Mapping[str, Union[float, int]],
+    ) -> None:
+        """Send metrics from the background thread, retrying if the server can't be reached."""
+        payload = _build_payload(metrics)
+        for attempt in range(self.ASYNC_RETRIES + 1):
+            try:
+                gateway.post(job_name, payload, verify_ssl, timeout)
+                return
+            except HTTPError as exc:
+                logger.error("Pushgateway rejected the metrics sent to %s: %s", exc.url, exc)
+                return
+            except OSError as exc:
+                if attempt == self.ASYNC_RETRIES:
+                    logger.error("Could not send the metrics to %s: %s", gateway.url, exc)
+                    return
+                time.sleep(self.ASYNC_RETRY_BACKOFF * 2**attempt)
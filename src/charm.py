@@ -7,7 +7,9 @@
 
 """A Juju Charmed Operator for Prometheus Pushgateway."""
 
+import functools
 import logging
+import re
 import socket
 import typing
 from typing import Any, Dict, List, Optional
@@ -19,11 +21,12 @@ from charms.observability_libs.v0.cert_handler import CertHandler
 from charms.prometheus_k8s.v0.prometheus_scrape import MetricsEndpointProvider
 from charms.prometheus_pushgateway_k8s.v0.pushgateway import PrometheusPushgatewayProvider
 from charms.traefik_k8s.v2.ingress import IngressPerAppRequirer
+from ops import pebble
 from ops.charm import CharmBase
+from ops.framework import StoredState
 from ops.main import main
 from ops.model import ActiveStatus, OpenedPort, WaitingStatus
 from ops.pebble import Layer
-from parse import Result, search  # type: ignore
 
 # By default, Pushgateway does not persist metrics, but we can specify a file in which
 # the pushed metrics will be persisted (so that they survive restarts of the Pushgateway)
@@ -39,6 +42,9 @@ CA_CERT_PATH = f"{PUSHGATEWAY_DIR}/cos-ca.crt"
 CA_CERT_TRUSTED_PATH = "/usr/local/share/ca-certificates/cos-ca.crt"
 WEB_CONFIG_PATH = f"{PUSHGATEWAY_DIR}/web-config.yml"
 
+# the version in the output of `pushgateway --version`
+VERSION_RE = re.compile(r"^pushgateway, version (\S+)", re.MULTILINE)
+
 logger = logging.getLogger(__name__)
 
 
@@ -48,9 +54,17 @@ class PrometheusPushgatewayK8SOperatorCharm(CharmBase):
     _name = "pushgateway"
     _http_listen_port = 9091
     _instance_addr = "127.0.0.1"
+    _stored = StoredState()
 
     def __init__(self, *args):
         super().__init__(*args)
+        # the version of the workload, and the stat of the binary it was taken from
+        self._stored.set_default(service_version=None, binary_stat=None)
+        # if the opened ports were already synced (only needs to be checked again on upgrades)
+        self._stored.set_default(ports_synced=False)
+        # if the TLS files are in place; checked once and reused by the endpoint, the
+        # scrape jobs and the web config, until the files may have changed
+        self._tls_ready_cached: Optional[bool] = None
         self._container = self.unit.get_container(self._name)
         self._set_ports()
 
@@ -107,8 +121,15 @@ class PrometheusPushgatewayK8SOperatorCharm(CharmBase):
         self.framework.observe(self.on.upgrade_charm, self._on_upgrade_charm)
         self.framework.observe(self.on.update_status, self._on_update_status)
 
-    @property
+        # several events may ask to configure the workload in the same dispatch (e.g. deferred
+        # ones, or a certificate change while handling a relation); do it once at the end, on
+        # pre-commit as changes to the stored state made on commit are not saved
+        self._configure_needed = False
+        self.framework.observe(self.framework.on.pre_commit, self._on_pre_commit)
+
+    @functools.cached_property
     def _hostname(self) -> str:
+        # may need a reverse DNS lookup, and it's used all around; it won't change in the hook
         return socket.getfqdn()
 
     @property
@@ -156,6 +177,26 @@ class PrometheusPushgatewayK8SOperatorCharm(CharmBase):
         if not self._container.can_connect():
             return None
 
+        # running the binary is slow, only do it again if it changed since last hook
+        binary_stat = self._binary_stat()
+        if binary_stat is not None and binary_stat == self._stored.binary_stat:
+            return self._stored.service_version
+
+        version = self._get_service_version()
+        if binary_stat is not None:
+            self._stored.service_version = version
+            self._stored.binary_stat = binary_stat
+        return version
+
+    def _binary_stat(self) -> Optional[str]:
+        """Return the size and modification time of the workload binary, if available."""
+        try:
+            (info,) = self._container.list_files(PUSHGATEWAY_BINARY)
+        except (pebble.APIError, pebble.PathError, ValueError):
+            return None
+        return f"{info.size}:{info.last_modified.isoformat()}"
+
+    def _get_service_version(self) -> Optional[str]:
         version_output, _ = self._container.exec([PUSHGATEWAY_BINARY, "--version"]).wait_output()
         # Output looks like this:
         # pushgateway, version 1.5.1 (branch: HEAD, revision: 7afc96cfc3b20e56968ff30eea22b70e)
@@ -173,14 +214,8 @@ class PrometheusPushgatewayK8SOperatorCharm(CharmBase):
         #
         # That is why we have this workaround here:
         version_output = _ if _ else version_output
-        result = search("pushgateway, version {} ", version_output)
-
-        if result is None:
-            return result
-
-        result = typing.cast(Result, result)
-
-        return result[0]
+        match = VERSION_RE.search(version_output)
+        return match.group(1) if match else None
 
     @property
     def _certs_available(self) -> bool:
@@ -193,12 +228,20 @@ class PrometheusPushgatewayK8SOperatorCharm(CharmBase):
 
     @property
     def _tls_ready(self) -> bool:
-        return (
-            self._container.can_connect()
-            and self._container.exists(CERT_PATH)
-            and self._container.exists(KEY_PATH)
-            and self._container.exists(CA_CERT_PATH)
-        )
+        if self._tls_ready_cached is None:
+            self._tls_ready_cached = self._check_tls_ready()
+        return self._tls_ready_cached
+
+    def _check_tls_ready(self) -> bool:
+        """Check if the certificate, key and CA files are in the workload container."""
+        if not self._container.can_connect():
+            return False
+        # all the files are in the same dir, list it instead of checking them one by one
+        try:
+            files = {info.path for info in self._container.list_files(PUSHGATEWAY_DIR)}
+        except (pebble.APIError, pebble.PathError):
+            return False
+        return {CERT_PATH, KEY_PATH, CA_CERT_PATH}.issubset(files)
 
     @property
     def _self_metrics_jobs(self) -> List[Dict[str, Any]]:
@@ -215,24 +258,33 @@ class PrometheusPushgatewayK8SOperatorCharm(CharmBase):
         self._update_certs()
         self._scraping.update_scrape_job_spec(self._self_metrics_jobs)
         self.pushgateway_provider.update_endpoint(self._endpoint)
-        self._configure()
+        self._configure_needed = True
 
     def _on_pebble_ready(self, _) -> None:
-        self._configure()
+        self._configure_needed = True
 
     def _on_config_changed(self, _) -> None:
-        self._configure()
+        self._configure_needed = True
 
     def _on_stop(self, _) -> None:
         self.unit.set_workload_version("")
 
     def _on_upgrade_charm(self, _) -> None:
-        self._configure()
+        self._stored.binary_stat = None
+        self._stored.ports_synced = False
+        self._set_ports()
+        self._configure_needed = True
 
     def _on_update_status(self, _) -> None:
-        self._configure()
+        self._configure_needed = True
+
+    def _on_pre_commit(self, _) -> None:
+        if self._configure_needed:
+            self._configure_needed = False
+            self._configure()
 
     def _configure(self) -> None:
+        self._tls_ready_cached = None
         if not self._container.can_connect():
             self.unit.status = WaitingStatus("Waiting for Pebble ready")
             return
@@ -247,11 +299,16 @@ class PrometheusPushgatewayK8SOperatorCharm(CharmBase):
         self.unit.status = ActiveStatus()
 
     def _handle_web_config(self) -> None:
+        # only touch the file when it needs to change, this runs on every update-status
         if web_config := self._web_config:
-            self._container.push(
-                WEB_CONFIG_PATH, yaml.safe_dump(web_config), make_dirs=True, encoding="utf-8"
-            )
-        else:
+            content = yaml.safe_dump(web_config)
+            try:
+                current = self._container.pull(WEB_CONFIG_PATH, encoding="utf-8").read()
+            except pebble.PathError:
+                current = None
+            if current != content:
+                self._container.push(WEB_CONFIG_PATH, content, make_dirs=True, encoding="utf-8")
+        elif self._container.exists(WEB_CONFIG_PATH):
             self._container.remove_path(WEB_CONFIG_PATH, recursive=True)
 
     def _update_certs(self) -> None:
@@ -278,6 +335,7 @@ class PrometheusPushgatewayK8SOperatorCharm(CharmBase):
                 self._container.remove_path(f, recursive=True)
 
         self._container.exec(["update-ca-certificates", "--fresh"]).wait()
+        self._tls_ready_cached = None
 
     def _set_service_version(self) -> bool:
         """Set the service version in the unit."""
@@ -328,6 +386,9 @@ class PrometheusPushgatewayK8SOperatorCharm(CharmBase):
 
     def _set_ports(self) -> None:
         """Open necessary (and close no longer needed) workload ports."""
+        if self._stored.ports_synced:
+            return
+
         planned_ports = {
             OpenedPort("tcp", self._http_listen_port),
         }
@@ -342,6 +403,8 @@ class PrometheusPushgatewayK8SOperatorCharm(CharmBase):
         for p in new_ports_to_open:
             self.unit.open_port(p.protocol, p.port)
 
+        self._stored.ports_synced = True
+
 
 if __name__ == "__main__":  # pragma: nocover
     main(PrometheusPushgatewayK8SOperatorCharm)
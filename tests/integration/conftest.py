@@ -3,11 +3,12 @@
 
 import functools
 import logging
-import shutil
+import os
 from datetime import datetime
 from pathlib import Path
 
 import pytest
+import yaml
 from pytest_operator.plugin import OpsTest
 
 CHARMLIB_PATH = Path("lib/charms/prometheus_pushgateway_k8s/v0/pushgateway.py")
@@ -17,7 +18,19 @@ logger = logging.getLogger(__name__)
 store = {}
 
 
+@pytest.fixture(scope="session")
+def metadata() -> dict:
+    """The charm metadata, parsed once for all the tests."""
+    return yaml.safe_load(Path("./metadata.yaml").read_text())
+
+
 def timed_memoizer(func):
+    """Memoize the async function for the whole session, keyed by its name only.
+
+    The arguments are ignored, so only use it for functions that return the same
+    for any of them (e.g. the charm fixtures, which only take the OpsTest instance).
+    """
+
     @functools.wraps(func)
     async def wrapper(*args, **kwargs):
         fname = func.__qualname__
@@ -39,6 +52,9 @@ def timed_memoizer(func):
 @timed_memoizer
 async def pushgateway_charm(ops_test: OpsTest) -> Path:
     """Prometheus Pushgateway charm used for integration testing."""
+    if charm_path := os.environ.get("PUSHGATEWAY_CHARM_PATH"):
+        # a charm already packed (e.g. by the CI), skip the build
+        return Path(charm_path).absolute()
     charm = await ops_test.build_charm(".")
     return charm
 
@@ -49,14 +65,17 @@ async def tester_charm(ops_test: OpsTest) -> Path:
     """A charm to integration test the Pushgateway charm."""
     testingcharm_path = Path("tests") / "testingcharm"
 
+    # the library is hardlinked in the testing charm, and left there for the next run
+    # (it's ignored by git); only link it again if it's not the same file anymore
     dest_charmlib = testingcharm_path / CHARMLIB_PATH
-    shutil.rmtree(dest_charmlib.parent, ignore_errors=True)
-    dest_charmlib.parent.mkdir(parents=True)
-    dest_charmlib.hardlink_to(CHARMLIB_PATH)
+    dest_charmlib.parent.mkdir(parents=True, exist_ok=True)
+    if not (dest_charmlib.exists() and dest_charmlib.samefile(CHARMLIB_PATH)):
+        tmp_charmlib = dest_charmlib.with_suffix(".tmp")
+        tmp_charmlib.unlink(missing_ok=True)
+        tmp_charmlib.hardlink_to(CHARMLIB_PATH)
+        os.replace(tmp_charmlib, dest_charmlib)
 
     clean_cmd = ["charmcraft", "clean", "-p", testingcharm_path]
     await ops_test.run(*clean_cmd)
     charm = await ops_test.build_charm(testingcharm_path)
-
-    shutil.rmtree(dest_charmlib.parent)
     return charm
@@ -1,46 +1,160 @@
 # Copyright 2023 Canonical Ltd.
 # See LICENSE file for licensing details.
 
+import asyncio
+import functools
+import json
 import logging
-from typing import List
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
 
 import aiohttp
+from pytest_operator.plugin import OpsTest
+
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
 
 logger = logging.getLogger(__name__)
 
+# the last status got for each model, and when
+_status_cache: Dict[str, Tuple[float, Any]] = {}
+
+
+async def cached_status(ops_test: OpsTest, ttl: float = 10) -> Any:
+    """Get the model status, reusing the one got less than `ttl` seconds ago."""
+    key = ops_test.model_full_name
+    now = time.monotonic()
+    cached = _status_cache.get(key)
+    if cached is not None and now - cached[0] < ttl:
+        return cached[1]
+    status = await ops_test.model.get_status()
+    _status_cache[key] = (now, status)
+    return status
+
+
+async def unit_address(ops_test: OpsTest, app_name: str, unit_num: int = 0) -> str:
+    """Get the address of the application's unit."""
+    status = await cached_status(ops_test)
+    return status["applications"][app_name]["units"][f"{app_name}/{unit_num}"]["address"]
+
+
+class _HTTPService:
+    """Base for the helpers talking to a service over HTTP.
+
+    Use them as async context managers so all the requests share one session (and its
+    connections), e.g. when polling: `async with Prometheus(host) as prometheus: ...`
+    """
+
+    # maximum connections open to the service at the same time
+    CONNECTIONS_LIMIT = 4
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def __aenter__(self):
+        """Enter the context, the session is created on the first request."""
+        return self
 
-class Prometheus:
+    async def __aexit__(self, *exc_info) -> None:
+        """Close the session when leaving the context."""
+        await self.close()
+
+    async def close(self) -> None:
+        """Close the session, if open."""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """The session shared by the requests, created if needed."""
+        if self._session is None:
+            connector = aiohttp.TCPConnector(limit=self.CONNECTIONS_LIMIT, ssl=False)
+            # the services set no cookies we need, don't keep any
+            self._session = aiohttp.ClientSession(
+                connector=connector, cookie_jar=aiohttp.DummyCookieJar()
+            )
+        return self._session
+
+
+class Prometheus(_HTTPService):
     """Utility to get information from a Prometheus service."""
 
     def __init__(self, host: str, scheme: str = "http"):
-        self.base_url = f"{scheme}://{host}:9090"
+        super().__init__(f"{scheme}://{host}:9090")
 
     async def is_ready(self) -> bool:
         """Send a GET request to check readiness."""
         url = f"{self.base_url}/-/ready"
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, ssl=False) as response:
-                return response.status == 200
+        async with self.session.get(url) as response:
+            return response.status == 200
 
-    async def labels(self) -> List[str]:
-        """Send a GET request to get labels."""
+    async def has_label(self, label: str) -> bool:
+        """Check if the label exists, scanning the labels response without parsing it."""
         url = f"{self.base_url}/api/v1/label/__name__/values"
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, ssl=False) as response:
-                result = await response.json()
-        return result["data"] if result["status"] == "success" else []
+        needle = json.dumps(label).encode()
+        async with self.session.get(url) as response:
+            if response.status != 200:
+                return False
+            # keep the end of the previous chunk, in case the label is split between two
+            tail = b""
+            async for chunk in response.content.iter_chunked(65536):
+                data = tail + chunk
+                if needle in data:
+                    return True
+                tail = data[-len(needle) :]
+        return False
 
 
-class Loki:
+class Loki(_HTTPService):
     """Utility to get information from a Loki service."""
 
     def __init__(self, host: str, scheme: str = "http"):
-        self.base_url = f"{scheme}://{host}:3100"
+        super().__init__(f"{scheme}://{host}:3100")
 
     async def query(self, query: str):
         url = f"{self.base_url}/loki/api/v1/query_range"
         params = {"query": query}
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, params=params, ssl=False) as response:
-                result = await response.json()
+        async with self.session.get(url, params=params) as response:
+            result = json_loads(await response.read())
         return result["data"]["result"]
+
+
+async def wait_until(
+    predicate: Callable[[], Awaitable[bool]],
+    timeout: float = 120,
+    base: float = 1,
+    cap: float = 10,
+) -> bool:
+    """Poll the predicate until it's true, returning False if it's not in time.
+
+    The polls back off exponentially with full jitter, from around `base` seconds up to
+    `cap` between them, so a condition met quickly is seen quickly. Each poll is bounded
+    to 10 seconds, and timeouts or connection errors count as not met yet.
+    """
+    deadline = time.monotonic() + timeout
+    attempt = 0
+    while True:
+        try:
+            if await asyncio.wait_for(predicate(), timeout=10):
+                return True
+        except (asyncio.TimeoutError, aiohttp.ClientError):
+            pass  # not there yet, or still (re)starting
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        delay = random.uniform(0, min(cap, base * 2**attempt))
+        await asyncio.sleep(min(delay, remaining))
+        attempt += 1
+
+
+async def wait_for_metric(prometheus: Prometheus, metric: str, timeout: float = 100) -> bool:
+    """Poll Prometheus until the metric is there, returning False if it's not in time."""
+    return await wait_until(
+        functools.partial(prometheus.has_label, metric), timeout=timeout, base=0.5, cap=5
+    )
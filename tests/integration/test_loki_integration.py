@@ -6,14 +6,11 @@ import logging
 from pathlib import Path
 
 import pytest
-import yaml
-from helpers import Loki
+from helpers import Loki, unit_address
 from pytest_operator.plugin import OpsTest
 
 logger = logging.getLogger(__name__)
 
-METADATA = yaml.safe_load(Path("./metadata.yaml").read_text())
-APP_NAME = METADATA["name"]
 CHARMLIB_PATH = Path("lib") / "charms" / "prometheus_pushgateway_k8s" / "v0" / "pushgateway.py"
 
 
@@ -21,19 +18,21 @@ CHARMLIB_PATH = Path("lib") / "charms" / "prometheus_pushgateway_k8s" / "v0" / "
 async def test_loki_integration(
     ops_test: OpsTest,
     pushgateway_charm: Path,
+    metadata: dict,
 ):
     """Validate the integration between the Pushgateway and Loki."""
+    app_name = metadata["name"]
     loki_app_name = "loki"
-    apps = [APP_NAME, loki_app_name]
+    apps = [app_name, loki_app_name]
 
-    image = METADATA["resources"]["pushgateway-image"]["upstream-source"]
+    image = metadata["resources"]["pushgateway-image"]["upstream-source"]
     resources = {"pushgateway-image": image}
 
     await asyncio.gather(
         ops_test.model.deploy(
             pushgateway_charm,
             resources=resources,
-            application_name=APP_NAME,
+            application_name=app_name,
         ),
         ops_test.model.deploy(
             "loki-k8s",
@@ -50,14 +49,11 @@ async def test_loki_integration(
     logger.info("All services active")
 
     # prepare the Loki helper and check it's ready
-    status = await ops_test.model.get_status()
-    app = status["applications"][loki_app_name]
-    host = app["units"][f"{loki_app_name}/0"]["address"]
-    loki = Loki(host)
+    host = await unit_address(ops_test, loki_app_name)
     logger.info("Loki ready")
 
     await asyncio.gather(
-        ops_test.model.add_relation(f"{APP_NAME}:log-proxy", f"{loki_app_name}"),
+        ops_test.model.add_relation(f"{app_name}:log-proxy", f"{loki_app_name}"),
     )
     logger.info("Relations issued")
 
@@ -65,5 +61,6 @@ async def test_loki_integration(
     logger.info("All services related")
 
     await asyncio.sleep(10)
-    result = await loki.query(query='{juju_charm="prometheus-pushgateway-k8s"} |= ``')
+    async with Loki(host) as loki:
+        result = await loki.query(query='{juju_charm="prometheus-pushgateway-k8s"} |= ``')
     assert result
@@ -6,14 +6,11 @@ import logging
 from pathlib import Path
 
 import pytest
-import yaml
-from helpers import Prometheus
+from helpers import Prometheus, unit_address, wait_for_metric
 from pytest_operator.plugin import OpsTest
 
 logger = logging.getLogger(__name__)
 
-METADATA = yaml.safe_load(Path("./metadata.yaml").read_text())
-APP_NAME = METADATA["name"]
 CHARMLIB_PATH = Path("lib") / "charms" / "prometheus_pushgateway_k8s" / "v0" / "pushgateway.py"
 
 
@@ -22,20 +19,22 @@ async def test_prometheus_integration(
     ops_test: OpsTest,
     pushgateway_charm: Path,
     tester_charm: Path,
+    metadata: dict,
 ):
     """Validate the integration between the Pushgateway and Prometheous."""
+    app_name = metadata["name"]
     prometheus_app_name = "prometheus"
     tester_name = "testingcharm"
-    apps = [APP_NAME, prometheus_app_name, tester_name]
+    apps = [app_name, prometheus_app_name, tester_name]
 
-    image = METADATA["resources"]["pushgateway-image"]["upstream-source"]
+    image = metadata["resources"]["pushgateway-image"]["upstream-source"]
     resources = {"pushgateway-image": image}
 
     await asyncio.gather(
         ops_test.model.deploy(
             pushgateway_charm,
             resources=resources,
-            application_name=APP_NAME,
+            application_name=app_name,
         ),
         ops_test.model.deploy(
             "prometheus-k8s",
@@ -56,20 +55,18 @@ async def test_prometheus_integration(
     logger.info("All services active")
 
     # prepare the Prometheus helper and check it's ready
-    status = await ops_test.model.get_status()
-    app = status["applications"][prometheus_app_name]
-    host = app["units"][f"{prometheus_app_name}/0"]["address"]
-    prometheus = Prometheus(host)
-    assert await prometheus.is_ready()
-    logger.info("Prometheus ready")
-
-    await asyncio.gather(
-        ops_test.model.add_relation(
-            f"{APP_NAME}:metrics-endpoint", f"{prometheus_app_name}:metrics-endpoint"
-        ),
-        ops_test.model.add_relation(f"{tester_name}:pushgateway", f"{APP_NAME}:push-endpoint"),
-    )
-    logger.info("Relations issued")
+    host = await unit_address(ops_test, prometheus_app_name)
+    # and issue the relations meanwhile, they only take effect in later hooks
+    async with Prometheus(host) as prometheus:
+        ready, *_ = await asyncio.gather(
+            prometheus.is_ready(),
+            ops_test.model.add_relation(
+                f"{app_name}:metrics-endpoint", f"{prometheus_app_name}:metrics-endpoint"
+            ),
+            ops_test.model.add_relation(f"{tester_name}:pushgateway", f"{app_name}:push-endpoint"),
+        )
+    assert ready
+    logger.info("Prometheus ready, relations issued")
 
     await ops_test.model.wait_for_idle(apps=apps, status="active")
     logger.info("All services related")
@@ -82,11 +79,8 @@ async def test_prometheus_integration(
     assert result["ok"] == "True", result
     logger.info("Metric sent to the Pushgateway")
 
-    for i in range(20):
-        labels = await prometheus.labels()
-        if test_metric in labels:
+    async with Prometheus(host) as prometheus:
+        if await wait_for_metric(prometheus, test_metric):
             logger.info("Metric shown in Prometheus")
-            break
-        await asyncio.sleep(5)
-    else:
-        pytest.fail("Metric didn't get to Prometheus")
+        else:
+            pytest.fail("Metric didn't get to Prometheus")
@@ -6,14 +6,11 @@ import logging
 from pathlib import Path
 
 import pytest
-import yaml
-from helpers import Prometheus
+from helpers import Prometheus, unit_address, wait_for_metric, wait_until
 from pytest_operator.plugin import OpsTest
 
 logger = logging.getLogger(__name__)
 
-METADATA = yaml.safe_load(Path("./metadata.yaml").read_text())
-APP_NAME = METADATA["name"]
 CHARMLIB_PATH = Path("lib") / "charms" / "prometheus_pushgateway_k8s" / "v0" / "pushgateway.py"
 
 
@@ -22,21 +19,23 @@ async def test_prometheus_integration_tls(
     ops_test: OpsTest,
     pushgateway_charm: Path,
     tester_charm: Path,
+    metadata: dict,
 ):
     """Validate the integration between the Pushgateway and Prometheous using SSL."""
+    app_name = metadata["name"]
     prometheus_app_name = "prometheus"
     tester_name = "testingcharm"
     ca_name = "ca"
-    apps = [APP_NAME, prometheus_app_name, tester_name, ca_name]
+    apps = [app_name, prometheus_app_name, tester_name, ca_name]
 
-    image = METADATA["resources"]["pushgateway-image"]["upstream-source"]
+    image = metadata["resources"]["pushgateway-image"]["upstream-source"]
     resources = {"pushgateway-image": image}
 
     await asyncio.gather(
         ops_test.model.deploy(
             pushgateway_charm,
             resources=resources,
-            application_name=APP_NAME,
+            application_name=app_name,
         ),
         ops_test.model.deploy(
             "prometheus-k8s",
@@ -63,23 +62,24 @@ async def test_prometheus_integration_tls(
     logger.info("All services active")
 
     # prepare the Prometheus helper and check it's ready
-    status = await ops_test.model.get_status()
-    app = status["applications"][prometheus_app_name]
-    host = app["units"][f"{prometheus_app_name}/0"]["address"]
-    prometheus = Prometheus(host)
-    assert await prometheus.is_ready()
+    host = await unit_address(ops_test, prometheus_app_name)
+    async with Prometheus(host) as prometheus:
+        assert await prometheus.is_ready()
     logger.info("Prometheus ready")
 
     await asyncio.gather(
         ops_test.model.add_relation(
-            f"{APP_NAME}:metrics-endpoint", f"{prometheus_app_name}:metrics-endpoint"
+            f"{app_name}:metrics-endpoint", f"{prometheus_app_name}:metrics-endpoint"
         ),
-        ops_test.model.add_relation(APP_NAME, ca_name),
+        ops_test.model.add_relation(app_name, ca_name),
         ops_test.model.add_relation(prometheus_app_name, ca_name),
-        ops_test.model.add_relation(f"{tester_name}:pushgateway", f"{APP_NAME}:push-endpoint"),
+        ops_test.model.add_relation(f"{tester_name}:pushgateway", f"{app_name}:push-endpoint"),
     )
     logger.info("Relations issued")
-    await asyncio.sleep(100)
+
+    # wait for Prometheus to switch to TLS
+    async with Prometheus(host, scheme="https") as prometheus:
+        assert await wait_until(prometheus.is_ready, timeout=100)
     await ops_test.model.wait_for_idle(apps=apps, status="active")
     logger.info("All services related")
 
@@ -92,11 +92,8 @@ async def test_prometheus_integration_tls(
     assert result["ok"] == "True", result
     logger.info("Metric sent to the Pushgateway")
 
-    await asyncio.sleep(100)
-    prometheus = Prometheus(host, scheme="https")
-    labels = await prometheus.labels()
-
-    if test_metric in labels:
-        logger.info("Metric shown in Prometheus")
-    else:
-        pytest.fail("Metric didn't get to Prometheus")
+    async with Prometheus(host, scheme="https") as prometheus:
+        if await wait_for_metric(prometheus, test_metric):
+            logger.info("Metric shown in Prometheus")
+        else:
+            pytest.fail("Metric didn't get to Prometheus")
@@ -11,6 +11,7 @@ with the Prometheus Pushgateway charm and provides an action to send metrics the
 """
 
 import logging
+import re
 
 from charms.prometheus_pushgateway_k8s.v0.pushgateway import PrometheusPushgatewayRequirer
 from ops.charm import ActionEvent, CharmBase
@@ -20,6 +21,9 @@ from ops.model import ActiveStatus
 # Log messages can be retrieved using juju debug-log
 logger = logging.getLogger(__name__)
 
+# printable ASCII characters, no spaces (the library validates the metric name grammar)
+VALID_NAME_RE = re.compile(r"[!-~]+")
+
 
 class TestingcharmCharm(CharmBase):
     """Charm the service."""
@@ -29,6 +33,7 @@ class TestingcharmCharm(CharmBase):
 
         self.framework.observe(self.on.install, self._on_install)
         self.framework.observe(self.on.send_metric_action, self._on_send_metric)
+        self.framework.observe(self.on.send_metrics_action, self._on_send_metrics)
 
         self.pushgateway_requirer = PrometheusPushgatewayRequirer(self)
 
@@ -42,8 +47,8 @@ class TestingcharmCharm(CharmBase):
             return
 
         name = event.params["name"].strip()
-        if " " in name:
-            event.fail("The metric name cannot contain spaces.")
+        if not VALID_NAME_RE.fullmatch(name):
+            event.fail("The metric name must be ASCII and cannot contain spaces.")
             return
         try:
             value = float(event.params["value"])
@@ -51,12 +56,35 @@ class TestingcharmCharm(CharmBase):
             event.fail("The metric value must be a float.")
             return
 
-        if not name.isascii():
-            event.fail("The metric name must be ASCII.")
+        try:
+            self.pushgateway_requirer.send_metric(name, value, verify_ssl=False)
+        except Exception as exc:
+            event.set_results({"ok": False, "error": str(exc)})
+        else:
+            event.set_results({"ok": True})
+
+    def _on_send_metrics(self, event: ActionEvent) -> None:
+        if not self.pushgateway_requirer.is_ready():
+            event.fail("The Prometheus Pushgateway service is not currently available.")
+            return
+
+        metrics = {}
+        for pair in event.params["metrics"].split():
+            name, sep, raw_value = pair.partition("=")
+            if not sep or not VALID_NAME_RE.fullmatch(name):
+                event.fail(f"Invalid metric {pair!r}, it must be name=value.")
+                return
+            try:
+                metrics[name] = float(raw_value)
+            except ValueError:
+                event.fail(f"The value of metric {name!r} must be a float.")
+                return
+        if not metrics:
+            event.fail("No metrics to send.")
             return
 
         try:
-            self.pushgateway_requirer.send_metric(name, value, verify_ssl=False)
+            self.pushgateway_requirer.send_metrics(metrics, verify_ssl=False)
         except Exception as exc:
             event.set_results({"ok": False, "error": str(exc)})
         else:
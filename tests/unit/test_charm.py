@@ -3,11 +3,18 @@
 #
 # Learn more about testing at: https://juju.is/docs/sdk/testing
 
-import unittest
+from unittest.mock import patch
 
 import ops.testing
-from charm import PrometheusPushgatewayK8SOperatorCharm
-from ops.model import ActiveStatus
+import pytest
+from charm import (
+    CA_CERT_PATH,
+    CERT_PATH,
+    KEY_PATH,
+    WEB_CONFIG_PATH,
+    PrometheusPushgatewayK8SOperatorCharm,
+)
+from ops.model import ActiveStatus, OpenedPort
 from ops.testing import Harness
 
 ops.testing.SIMULATE_CAN_CONNECT = True
@@ -21,30 +28,97 @@ pushgateway, version 1.5.1 (branch: HEAD, revision: 7afc96cfc3b20e56968ff30eea22
 """
 
 
-class TestCharm(unittest.TestCase):
-    def setUp(self, *_):
-        self.container_name: str = "pushgateway"
-        self.harness = Harness(PrometheusPushgatewayK8SOperatorCharm)
-        self.harness.handle_exec(
-            "pushgateway", ["/bin/pushgateway", "--version"], result=VERSION_OUTPUT
-        )
-        self.harness.begin()
-
-    def test_pebble_ready_ok(self):
-        expected_plan = {
-            "services": {
-                "pushgateway": {
-                    "override": "replace",
-                    "summary": "pushgateway process",
-                    "command": "/bin/sh -c '/bin/pushgateway --persistence.file=/data/metrics 2>&1 | tee /var/log/pushgateway.log'",
-                    "startup": "enabled",
-                }
-            },
-        }
-
-        self.harness.container_pebble_ready("pushgateway")
-        updated_plan = self.harness.get_container_pebble_plan("pushgateway").to_dict()
-        self.assertDictEqual(expected_plan, updated_plan)
-        service = self.harness.model.unit.get_container("pushgateway").get_service("pushgateway")
-        self.assertTrue(service.is_running())
-        self.assertEqual(self.harness.model.unit.status, ActiveStatus())
+@pytest.fixture()
+def harness():
+    harness = Harness(PrometheusPushgatewayK8SOperatorCharm)
+    harness.handle_exec("pushgateway", ["/bin/pushgateway", "--version"], result=VERSION_OUTPUT)
+    harness.begin()
+    return harness
+
+
+def test_pebble_ready_ok(harness):
+    expected_plan = {
+        "services": {
+            "pushgateway": {
+                "override": "replace",
+                "summary": "pushgateway process",
+                "command": "/bin/sh -c '/bin/pushgateway --persistence.file=/data/metrics 2>&1 | tee /var/log/pushgateway.log'",
+                "startup": "enabled",
+            }
+        },
+    }
+
+    harness.container_pebble_ready("pushgateway")
+    harness.framework.commit()
+    updated_plan = harness.get_container_pebble_plan("pushgateway").to_dict()
+    assert updated_plan == expected_plan
+    service = harness.model.unit.get_container("pushgateway").get_service("pushgateway")
+    assert service.is_running()
+    assert harness.model.unit.status == ActiveStatus()
+
+
+def test_service_version_cached(harness):
+    version_calls = []
+
+    def version_handler(args):
+        version_calls.append(args)
+        return ops.testing.ExecResult(stdout=VERSION_OUTPUT)
+
+    harness.handle_exec("pushgateway", ["/bin/pushgateway", "--version"], handler=version_handler)
+    container = harness.model.unit.get_container("pushgateway")
+    harness.container_pebble_ready("pushgateway")
+    harness.framework.commit()
+    container.push("/bin/pushgateway", "binary", make_dirs=True)
+
+    harness.charm.on.update_status.emit()
+    harness.framework.commit()
+    # it's saved by that commit, for the next hooks
+    stored_path = harness.charm._stored._data.handle.path
+    assert harness.framework._storage.load_snapshot(stored_path)["service_version"] == "1.5.1"
+
+    harness.charm.on.update_status.emit()
+    harness.framework.commit()
+    assert len(version_calls) == 2  # pebble-ready (no binary) + the first update
+    assert harness.get_workload_version() == "1.5.1"
+
+    harness.charm.on.upgrade_charm.emit()
+    harness.framework.commit()
+    assert len(version_calls) == 3
+
+
+def test_web_config_written_once(harness):
+    container = harness.model.unit.get_container("pushgateway")
+    harness.container_pebble_ready("pushgateway")
+    harness.framework.commit()
+    for path in (CERT_PATH, KEY_PATH, CA_CERT_PATH):
+        container.push(path, "cert", make_dirs=True)
+
+    with patch.object(container, "push", wraps=container.push) as push:
+        harness.charm.on.update_status.emit()
+        harness.framework.commit()
+        harness.charm.on.update_status.emit()
+        harness.framework.commit()
+
+    assert [c.args[0] for c in push.call_args_list] == [WEB_CONFIG_PATH]
+    assert "tls_server_config" in container.pull(WEB_CONFIG_PATH).read()
+
+
+def test_configured_once_per_dispatch(harness):
+    with patch.object(harness.charm, "_configure") as configure:
+        harness.charm.on.config_changed.emit()
+        harness.charm.on.update_status.emit()
+        configure.assert_not_called()
+        harness.framework.commit()
+    configure.assert_called_once()
+
+
+def test_ports_synced_once(harness):
+    assert harness.model.unit.opened_ports() == {OpenedPort("tcp", 9091)}
+    harness.model.unit.close_port("tcp", 9091)
+    harness.model.unit.open_port("tcp", 8080)
+
+    harness.charm._set_ports()
+    assert harness.model.unit.opened_ports() == {OpenedPort("tcp", 8080)}
+
+    harness.charm.on.upgrade_charm.emit()
+    assert harness.model.unit.opened_ports() == {OpenedPort("tcp", 9091)}
@@ -3,20 +3,82 @@
 
 """Tests for the pushgateway.py charm library."""
 
-import io
+import asyncio
+import gzip
 import json
-import ssl
-from unittest.mock import patch
-from urllib import response
-from urllib.error import HTTPError
+import socket
+import threading
+from http import client
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+from urllib.error import HTTPError, URLError
 
 import pytest
+from charms.prometheus_pushgateway_k8s.v0.pushgateway import (
+    CONTENT_TYPE,
+    PrometheusPushgatewayRequirer,
+    _PushgatewayClient,
+    _ssl_context,
+)
+from ops.charm import CharmBase
+from ops.model import RelationDataContent
 from ops.testing import Harness
 
 from src.charm import PrometheusPushgatewayK8SOperatorCharm
 from tests.testingcharm.src.charm import TestingcharmCharm
 
 TEST_URL = "http://hostname.test:9876/"
+# where the metrics are pushed when no job name is given
+DEFAULT_JOB_PATH = "/metrics/job/default"
+# the relation data as the provider sends it
+TEST_PAYLOAD = {"push-endpoint": json.dumps({"url": TEST_URL})}
+
+# the testing charm metadata, to build other charms requiring the pushgateway
+TESTINGCHARM_METADATA = Path(__file__).parents[1] / "testingcharm" / "metadata.yaml"
+
+# metrics that can be sent, and the body to send them
+SEND_OK_CASES = (
+    ("testmetric", 3.14, b"testmetric 3.14\n"),
+    ("testmetric", 314, b"testmetric 314\n"),
+    ("test_metric", 3.14, b"test_metric 3.14\n"),
+    ("testmetric", True, b"testmetric 1\n"),
+    ("testmetric", float("inf"), b"testmetric inf\n"),
+)
+
+
+class _RecordingHandler(BaseHTTPRequestHandler):
+    """Answer ok to the pushes, like the Pushgateway, recording what is received."""
+
+    protocol_version = "HTTP/1.1"  # so connections are kept alive
+
+    def do_POST(self):  # noqa: N802
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        self.server.received.append((self.client_address, self.path, self.headers, body))
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="session")
+def pushgateway_server():
+    """Serve a fake Pushgateway in a thread, for the whole session."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _RecordingHandler)
+    server.received = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture()
+def pushgateway_server_url(pushgateway_server):
+    """Provide the url of the fake Pushgateway, with nothing received yet."""
+    pushgateway_server.received.clear()
+    return f"http://127.0.0.1:{pushgateway_server.server_port}/"
 
 
 @pytest.fixture()
@@ -37,12 +99,29 @@ def testcharm_harness():
 @pytest.fixture()
 def related_requirer(testcharm_harness):
     """Provide an usefully related Prometheus Pushgateway Requirer."""
-    payload = {"push-endpoint": json.dumps({"url": TEST_URL})}
     relation_id = testcharm_harness.add_relation("pushgateway", "remote")
-    testcharm_harness.update_relation_data(relation_id, "remote", payload)
+    testcharm_harness.update_relation_data(relation_id, "remote", TEST_PAYLOAD)
     return testcharm_harness.charm.pushgateway_requirer
 
 
+class _AsyncSendingCharm(CharmBase):
+    """A charm using the Requirer to send the metrics in the background."""
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.pushgateway_requirer = PrometheusPushgatewayRequirer(self, async_send=True)
+
+
+@pytest.fixture()
+def related_async_requirer():
+    """Provide an usefully related Requirer that sends the metrics in the background."""
+    harness = Harness(_AsyncSendingCharm, meta=TESTINGCHARM_METADATA.read_text())
+    harness.begin()
+    relation_id = harness.add_relation("pushgateway", "remote")
+    harness.update_relation_data(relation_id, "remote", TEST_PAYLOAD)
+    return harness.charm.pushgateway_requirer
+
+
 @patch("socket.getfqdn", lambda: "testhost")
 def test_provider_relation(pushgateway_harness):
     """Send connection information when the relation is created."""
@@ -52,9 +131,42 @@ def test_provider_relation(pushgateway_harness):
     assert json.loads(data["push-endpoint"]) == {"url": provider.endpoint}
 
 
+@patch("socket.getfqdn", lambda: "testhost")
+def test_provider_update_endpoint(pushgateway_harness):
+    """Send the new connection information when the endpoint changes."""
+    provider = pushgateway_harness.charm.pushgateway_provider
+    relation_id = pushgateway_harness.add_relation("push-endpoint", "remote")
+
+    provider.update_endpoint("https://testhost:9091/")
+    data = pushgateway_harness.get_relation_data(relation_id, "prometheus-pushgateway-k8s")
+    assert json.loads(data["push-endpoint"]) == {"url": "https://testhost:9091/"}
+
+
+def test_provider_update_endpoint_unchanged(pushgateway_harness):
+    """The relation data is not written again if the endpoint didn't change."""
+    provider = pushgateway_harness.charm.pushgateway_provider
+    pushgateway_harness.add_relation("push-endpoint", "remote")
+
+    with patch.object(RelationDataContent, "__setitem__") as mock_setitem:
+        provider.update_endpoint(provider.endpoint)
+    mock_setitem.assert_not_called()
+
+
+def assert_posted(mock_connection, path, body):
+    """Check that the body was POSTed once to the path, with the proper headers."""
+    headers = {"Content-Type": CONTENT_TYPE, "Content-Length": str(len(body))}
+    conn = mock_connection.return_value
+    conn.request.assert_called_once_with("POST", path, body=body, headers=headers)
+
+
 @pytest.fixture()
-def empty_ssl_context():
-    return ssl.create_default_context()
+def mock_connection():
+    """Replace the HTTP connection to the Pushgateway, answering ok by default."""
+    with patch("http.client.HTTPConnection") as mock_connection_class:
+        conn = mock_connection_class.return_value
+        conn.getresponse.return_value.status = 200
+        conn.getresponse.return_value.will_close = False
+        yield mock_connection_class
 
 
 def test_requirer_pushgateway_init(testcharm_harness):
@@ -73,12 +185,10 @@ def test_requirer_pushgateway_relation_changed_empty(testcharm_harness):
 def test_requirer_pushgateway_relation_changed_with_data(testcharm_harness):
     """The pushgateway is ready when the relation is established and has data."""
     requirer = testcharm_harness.charm.pushgateway_requirer
-    payload = {"push-endpoint": json.dumps({"url": TEST_URL})}
-
     relation_id = testcharm_harness.add_relation("pushgateway", "remote")
-    testcharm_harness.update_relation_data(relation_id, "remote", payload)
+    testcharm_harness.update_relation_data(relation_id, "remote", TEST_PAYLOAD)
     assert requirer.is_ready()
-    assert requirer._pushgateway_url == TEST_URL
+    assert requirer._resolve() == TEST_URL
 
 
 @pytest.mark.parametrize(
@@ -101,9 +211,8 @@ def test_requirer_pushgateway_relation_changed_bad_data(testcharm_harness, paylo
 def test_requirer_pushgateway_relation_broken(testcharm_harness):
     """The pushgateway url is cleared if the relation disappears."""
     requirer = testcharm_harness.charm.pushgateway_requirer
-    payload = {"push-endpoint": json.dumps({"url": TEST_URL})}
     relation_id = testcharm_harness.add_relation("pushgateway", "remote")
-    testcharm_harness.update_relation_data(relation_id, "remote", payload)
+    testcharm_harness.update_relation_data(relation_id, "remote", TEST_PAYLOAD)
     assert requirer.is_ready()
 
     testcharm_harness.remove_relation(relation_id)
@@ -123,13 +232,18 @@ def test_requirer_sendmetric_not_ready(testcharm_harness):
         "moño",  # not ascii
         123,  # not a string
         "",  # empty
+        "test metric",  # spaces
+        "test-metric",  # invalid chars
+        "1testmetric",  # starting with a digit
+        "testmetric\n",  # trailing new line
+        ["testmetric"],  # not hashable
     ],
 )
 def test_requirer_sendmetric_bad_name_input(related_requirer, name):
-    """Validate the name input to ensure the URL is properly built."""
+    """Validate the name input to ensure the payload is properly built."""
     with pytest.raises(ValueError) as cm:
         related_requirer.send_metric(name, 3.21)
-    assert str(cm.value) == "The name must be a non-empty ASCII string."
+    assert str(cm.value) == "The name must be a valid Prometheus metric name."
 
 
 @pytest.mark.parametrize(
@@ -146,44 +260,335 @@ def test_requirer_sendmetric_bad_value_input(related_requirer, value):
     assert str(cm.value) == "The metric value must be an integer or float number."
 
 
-@pytest.mark.parametrize(
-    "name, value, expected_body, verify_ssl",
-    [
-        ("testmetric", 3.14, b"testmetric 3.14\n", False),
-        ("testmetric", 314, b"testmetric 314\n", False),
-        ("test_metric", 3.14, b"test_metric 3.14\n", False),
-        ("testmetric", 3.14, b"testmetric 3.14\n", True),
-        ("testmetric", 314, b"testmetric 314\n", True),
-        ("test_metric", 3.14, b"test_metric 3.14\n", True),
-    ],
-)
+@pytest.mark.parametrize("verify_ssl", [False, True])
+@pytest.mark.parametrize("name, value, expected_body", SEND_OK_CASES)
 def test_requirer_sendmetric_ok(
-    related_requirer, name, value, expected_body, verify_ssl, empty_ssl_context
+    related_requirer, name, value, expected_body, verify_ssl, mock_connection
 ):
     """The metric was sent ok."""
-    expected_url = TEST_URL + "metrics/job/default"
-    fake_resp = response.addinfourl(io.BytesIO(), {}, expected_url, code=200)
-
-    with patch("ssl.create_default_context", return_value=empty_ssl_context):
-        with patch("urllib.request.urlopen", return_value=fake_resp) as mock_urlopen:
-            related_requirer.send_metric(name, value, verify_ssl)
-        mock_urlopen.assert_called_with(
-            expected_url, data=expected_body, context=empty_ssl_context
+    related_requirer.send_metric(name, value, verify_ssl=verify_ssl)
+
+    mock_connection.assert_called_once_with("hostname.test:9876", timeout=5.0)
+    assert_posted(mock_connection, DEFAULT_JOB_PATH, expected_body)
+
+
+def test_requirer_sendmetric_job_name_escaped(related_requirer, mock_connection):
+    """The job name can't alter the url the metrics are sent to."""
+    related_requirer.send_metric("testmetric", 3.14, job_name="test job/?x=1")
+
+    assert_posted(mock_connection, "/metrics/job/test%20job%2F%3Fx%3D1", b"testmetric 3.14\n")
+
+
+def test_requirer_sendmetric_https(testcharm_harness):
+    """The metric is sent through a TLS connection if the Pushgateway uses https."""
+    requirer = testcharm_harness.charm.pushgateway_requirer
+    payload = {"push-endpoint": json.dumps({"url": "https://hostname.test:9876/"})}
+    relation_id = testcharm_harness.add_relation("pushgateway", "remote")
+    testcharm_harness.update_relation_data(relation_id, "remote", payload)
+
+    with patch("http.client.HTTPSConnection") as mock_connection:
+        mock_connection.return_value.getresponse.return_value.status = 200
+        requirer.send_metric("testmetric", 3.14, verify_ssl=False)
+
+    (netloc,), kwargs = mock_connection.call_args
+    assert netloc == "hostname.test:9876"
+    assert not kwargs["context"].check_hostname
+
+
+def test_requirer_ssl_context_shared():
+    """The SSL contexts are built once for each verification setting."""
+    assert _ssl_context(True) is _ssl_context(True)
+    assert _ssl_context(True).check_hostname
+    assert not _ssl_context(False).check_hostname
+
+
+def test_requirer_sendmetric_connection_reused(related_requirer, mock_connection):
+    """Several metrics are sent through the same connection."""
+    related_requirer.send_metric("testmetric1", 3.14)
+    related_requirer.send_metric("testmetric2", 3.14)
+
+    mock_connection.assert_called_once()
+    assert mock_connection.return_value.request.call_count == 2
+
+
+def test_requirer_sendmetric_connection_closed_by_server(related_requirer, mock_connection):
+    """A new connection is opened if the server closed the kept-alive one."""
+    stale_conn = MagicMock()
+    stale_conn.request.side_effect = client.RemoteDisconnected()
+    related_requirer._client_for(TEST_URL)._connections[True] = [stale_conn]
+
+    related_requirer.send_metric("testmetric", 3.14)
+
+    stale_conn.close.assert_called_once()
+    mock_connection.return_value.request.assert_called_once()
+
+
+def test_requirer_batch_ok(related_requirer, mock_connection):
+    """The metrics sent in a batch go in the same request when the block ends."""
+    with related_requirer.batch(job_name="testjob") as batch:
+        batch.send_metric("testmetric", 3.14)
+        batch.send_metric("test_metric", 314)
+        mock_connection.return_value.request.assert_not_called()
+
+    assert_posted(mock_connection, "/metrics/job/testjob", b"testmetric 3.14\ntest_metric 314\n")
+
+
+def test_requirer_batch_error(related_requirer, mock_connection):
+    """Nothing is sent if the batch block ends with an error."""
+    with pytest.raises(ValueError):
+        with related_requirer.batch() as batch:
+            batch.send_metric("testmetric", 3.14)
+            batch.send_metric("bad name", 314)
+
+    mock_connection.return_value.request.assert_not_called()
+
+
+def test_requirer_asendmetrics_concurrent(related_requirer, mock_connection):
+    """Several metrics sent concurrently from an event loop are all sent."""
+
+    async def send_all():
+        await asyncio.gather(
+            related_requirer.asend_metric("testmetric1", 3.14),
+            related_requirer.asend_metrics({"testmetric2": 314}, job_name="testjob"),
         )
 
+    asyncio.run(send_all())
+
+    conn = mock_connection.return_value
+    assert conn.request.call_count == 2
+
+
+def test_client_sendmetric_ok(mock_connection):
+    """The client can be used on its own, without the ops framework."""
+    gateway = _PushgatewayClient(TEST_URL)
+    gateway.send_metric("testmetric", 3.14, job_name="testjob")
 
-def test_requirer_sendmetric_error_raised(related_requirer):
+    assert_posted(mock_connection, "/metrics/job/testjob", b"testmetric 3.14\n")
+
+
+def test_client_sendmetric_unreachable():
+    """Failing to reach the server is reported as URLError, as urllib does."""
+    gateway = _PushgatewayClient("http://127.0.0.1:1/")
+    with pytest.raises(URLError) as err:
+        gateway.send_metric("testmetric", 3.14)
+    assert isinstance(err.value.reason, ConnectionRefusedError)
+
+
+def test_requirer_connections_closed_on_relation_broken(
+    testcharm_harness, related_requirer, mock_connection
+):
+    """The connections to the pushgateway are closed when the relation is removed."""
+    related_requirer.send_metric("testmetric", 3.14)
+    mock_connection.return_value.close.assert_not_called()
+
+    relation = testcharm_harness.model.get_relation("pushgateway")
+    testcharm_harness.remove_relation(relation.id)
+    mock_connection.return_value.close.assert_called_once()
+    assert not related_requirer._clients
+
+
+def test_client_sendmetrics_equal_values_of_other_type(mock_connection):
+    """Equal values are each rendered as given (with its own type, or sign for zeros)."""
+    gateway = _PushgatewayClient(TEST_URL)
+    for value in (1, 1.0, True, 0.0, -0.0):
+        gateway.send_metrics({"testmetric": value})
+
+    bodies = [c.kwargs["body"] for c in mock_connection.return_value.request.call_args_list]
+    assert bodies == [
+        b"testmetric 1\n",
+        b"testmetric 1.0\n",
+        b"testmetric 1\n",
+        b"testmetric 0.0\n",
+        b"testmetric -0.0\n",
+    ]
+
+
+def test_client_sendmetrics_server(pushgateway_server, pushgateway_server_url):
+    """The metrics get to a real server, over the same connection."""
+    gateway = _PushgatewayClient(pushgateway_server_url)
+    gateway.send_metrics({"testmetric": 3.14}, job_name="test job")
+    gateway.send_metrics({"testmetric": 2.71}, job_name="test job")
+    gateway.close()
+
+    (addr1, path1, headers, body1), (addr2, path2, _, body2) = pushgateway_server.received
+    assert addr1 == addr2
+    assert path1 == path2 == "/metrics/job/test%20job"
+    assert headers["Content-Type"] == CONTENT_TYPE
+    assert (body1, body2) == (b"testmetric 3.14\n", b"testmetric 2.71\n")
+
+
+def test_client_sendmetrics_compressed_server(pushgateway_server, pushgateway_server_url):
+    """Compressed metrics get to a real server."""
+    gateway = _PushgatewayClient(pushgateway_server_url, compress_threshold=10)
+    gateway.send_metrics({"testmetric": 3.14, "test_metric": 314})
+    gateway.close()
+
+    ((_, _, headers, body),) = pushgateway_server.received
+    assert headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(body) == b"testmetric 3.14\ntest_metric 314\n"
+
+
+def test_client_sendmetrics_compressed(mock_connection):
+    """Payloads bigger than the threshold are sent gzipped."""
+    gateway = _PushgatewayClient(TEST_URL, compress_threshold=10)
+    gateway.send_metrics({"testmetric": 3.14, "test_metric": 314})
+
+    conn = mock_connection.return_value
+    (method, path), kwargs = conn.request.call_args
+    assert gzip.decompress(kwargs["body"]) == b"testmetric 3.14\ntest_metric 314\n"
+    assert kwargs["headers"]["Content-Encoding"] == "gzip"
+
+
+def test_client_sendmetrics_compression_refused(mock_connection):
+    """If the server refuses compressed payloads, they're sent (and kept being sent) plain."""
+    ok = mock_connection.return_value.getresponse.return_value
+    refused = MagicMock(status=415, will_close=False)
+    refused.read.return_value = b""
+    mock_connection.return_value.getresponse.side_effect = [refused, ok, ok]
+    gateway = _PushgatewayClient(TEST_URL, compress_threshold=10)
+    gateway.send_metrics({"testmetric": 3.14, "test_metric": 314})
+    gateway.send_metrics({"testmetric": 3.14, "test_metric": 314})
+
+    calls = mock_connection.return_value.request.call_args_list
+    assert [c.kwargs["body"] for c in calls[1:]] == [b"testmetric 3.14\ntest_metric 314\n"] * 2
+    assert gateway.compress_threshold is None
+
+
+def test_requirer_sendmetric_error_raised(related_requirer, mock_connection):
     """Error raised because the metric was not sent ok."""
-    expected_url = TEST_URL + "metrics/job/customjob"
-    fake_error = HTTPError(expected_url, 400, "BAD REQUEST", {}, io.BytesIO())
-    with patch("urllib.request.urlopen", side_effect=fake_error, job_name="customjob"):
-        with pytest.raises(HTTPError):
-            related_requirer.send_metric("testmetric", 3.14)
+    mock_connection.return_value.getresponse.return_value.status = 400
+    mock_connection.return_value.getresponse.return_value.read.return_value = b""
+    with pytest.raises(HTTPError) as cm:
+        related_requirer.send_metric("testmetric", 3.14, job_name="customjob")
+    assert cm.value.code == 400
+    assert cm.value.url == TEST_URL + "metrics/job/customjob"
 
 
-def test_requirer_sendmetric_error_ignored(related_requirer):
+def test_requirer_sendmetric_error_ignored(related_requirer, mock_connection):
     """The metric was not sent ok but the error is ignored."""
-    expected_url = TEST_URL + "metrics/job/default"
-    fake_error = HTTPError(expected_url, 400, "BAD REQUEST", {}, io.BytesIO())
-    with patch("urllib.request.urlopen", side_effect=fake_error):
+    mock_connection.return_value.getresponse.return_value.status = 400
+    mock_connection.return_value.getresponse.return_value.read.return_value = b""
+    related_requirer.send_metric("testmetric", 3.14, ignore_error=True)
+
+
+def test_requirer_sendmetrics_ok(related_requirer, mock_connection):
+    """Several metrics are sent in the same request."""
+    related_requirer.send_metrics({"testmetric": 3.14, "test_metric": 314}, job_name="testjob")
+
+    assert_posted(mock_connection, "/metrics/job/testjob", b"testmetric 3.14\ntest_metric 314\n")
+
+
+def test_requirer_sendmetrics_bad_input(related_requirer, mock_connection):
+    """Nothing is sent if any of the metrics is invalid."""
+    with pytest.raises(ValueError):
+        related_requirer.send_metrics({"testmetric": 3.14, "moño": 314})
+    mock_connection.return_value.request.assert_not_called()
+
+
+def test_requirer_pushgateway_url_updated(testcharm_harness):
+    """The pushgateway url is refreshed when the relation data changes."""
+    requirer = testcharm_harness.charm.pushgateway_requirer
+    relation_id = testcharm_harness.add_relation("pushgateway", "remote")
+    testcharm_harness.update_relation_data(relation_id, "remote", TEST_PAYLOAD)
+    assert requirer._resolve() == TEST_URL
+
+    new_url = "http://otherhost.test:9876/"
+    payload = {"push-endpoint": json.dumps({"url": new_url})}
+    testcharm_harness.update_relation_data(relation_id, "remote", payload)
+    assert requirer._resolve() == new_url
+
+
+def test_requirer_sendmetric_timeout_raised(related_requirer, mock_connection):
+    """Error raised because the Pushgateway did not answer in time."""
+    mock_connection.return_value.getresponse.side_effect = socket.timeout()
+    with pytest.raises(socket.timeout):
+        related_requirer.send_metric("testmetric", 3.14, timeout=1.5)
+    mock_connection.assert_called_once_with("hostname.test:9876", timeout=1.5)
+
+
+def test_requirer_sendmetric_timeout_ignored(related_requirer, mock_connection):
+    """The Pushgateway did not answer in time but the error is ignored."""
+    mock_connection.return_value.getresponse.side_effect = socket.timeout()
+    related_requirer.send_metric("testmetric", 3.14, ignore_error=True)
+
+
+def test_requirer_sendmetric_connect_timeout_raised(related_requirer):
+    """Error raised because the Pushgateway could not be connected in time."""
+    with patch("socket.create_connection", side_effect=socket.timeout("timed out")):
+        with pytest.raises(socket.timeout):
+            related_requirer.send_metric("testmetric", 3.14)
+
+
+def test_requirer_sendmetric_connect_timeout_ignored(related_requirer):
+    """The Pushgateway could not be connected in time but the error is ignored."""
+    with patch("socket.create_connection", side_effect=socket.timeout("timed out")):
         related_requirer.send_metric("testmetric", 3.14, ignore_error=True)
+
+
+def test_testingcharm_send_metrics_action(testcharm_harness, related_requirer, mock_connection):
+    """The testing charm sends all the metrics of the action in one request."""
+    output = testcharm_harness.run_action(
+        "send-metrics", {"metrics": "testmetric=3.14 test_metric=2"}
+    )
+
+    assert output.results == {"ok": True}
+    assert_posted(mock_connection, DEFAULT_JOB_PATH, b"testmetric 3.14\ntest_metric 2.0\n")
+
+
+def test_requirer_sendmetric_async(related_async_requirer, mock_connection):
+    """Metrics sent in the background close in time are grouped in one request."""
+    related_async_requirer.send_metric("testmetric", 3.14)
+    related_async_requirer.send_metric("test_metric", 314)
+    related_async_requirer.send_metric("testmetric", 2.71)
+    related_async_requirer.flush()
+
+    assert_posted(mock_connection, DEFAULT_JOB_PATH, b"testmetric 2.71\ntest_metric 314\n")
+
+
+def test_requirer_sendmetric_async_batch_size(related_async_requirer, mock_connection):
+    """Metrics sent in the background are grouped up to the batch size."""
+    related_async_requirer.ASYNC_BATCH_SIZE = 2
+    related_async_requirer.send_metric("testmetric", 3.14)
+    related_async_requirer.send_metric("test_metric", 314)
+    related_async_requirer.send_metric("testmetric", 2.71)
+    related_async_requirer.flush()
+
+    bodies = [c.kwargs["body"] for c in mock_connection.return_value.request.call_args_list]
+    assert bodies == [b"testmetric 3.14\ntest_metric 314\n", b"testmetric 2.71\n"]
+
+
+def test_requirer_sendmetric_async_error_logged(related_async_requirer, mock_connection, caplog):
+    """Errors while sending in the background are logged."""
+    mock_connection.return_value.getresponse.return_value.status = 400
+    mock_connection.return_value.getresponse.return_value.read.return_value = b""
+    related_async_requirer.send_metric("testmetric", 3.14)
+    related_async_requirer.flush()
+
+    assert "Pushgateway rejected the metrics" in caplog.text
+
+
+def test_requirer_sendmetric_async_unexpected_error(
+    related_async_requirer, mock_connection, caplog
+):
+    """Unexpected errors while sending in the background don't stop the sender thread."""
+    mock_connection.return_value.getresponse.side_effect = client.BadStatusLine("garbage")
+    related_async_requirer.send_metric("testmetric", 3.14)
+    flusher = threading.Thread(target=related_async_requirer.flush, daemon=True)
+    flusher.start()
+    flusher.join(timeout=5)
+    assert not flusher.is_alive()
+    assert "Error sending the metrics" in caplog.text
+
+    mock_connection.return_value.getresponse.side_effect = None
+    mock_connection.return_value.getresponse.return_value.status = 200
+    related_async_requirer.send_metric("testmetric", 2.71)
+    related_async_requirer.flush()
+    assert mock_connection.return_value.request.call_args.kwargs["body"] == b"testmetric 2.71\n"
+
+
+def test_requirer_sendmetrics_async_empty(related_async_requirer, mock_connection):
+    """Like when sending synchronously, no request is made for no metrics."""
+    related_async_requirer.send_metrics({})
+    related_async_requirer.flush()
+
+    mock_connection.return_value.request.assert_not_called()